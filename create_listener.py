@@ -1,8 +1,5 @@
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from main import predict
-import base64
-import tempfile
-import os
+import json
 import subprocess
 
 # Dracula: "I walked across the dunes of the Sahara Desert with nothin but a back of new ports and a fifth of henny"
@@ -18,8 +15,6 @@ class SimpleHandler(BaseHTTPRequestHandler):
         content_type = self.headers.get("Content-Type", "").lower()
         if "application/json" in content_type:
             try:
-                import json
-
                 payload = json.loads(raw_body.decode("utf-8") or "null")
                 response_bytes = json.dumps({"received": payload}).encode("utf-8")
 
@@ -31,7 +26,8 @@ class SimpleHandler(BaseHTTPRequestHandler):
                         response_bytes = json.dumps({"instance_id": payload["instance_id"]}).encode("utf-8")
                         # Might have to chmod before but idk
                         print(f"Received instance_id: {payload['instance_id']}")
-                        subprocess.run(["./create_container.sh", payload["instance_id"]])
+                        # docker run stays attached, so don't wait on it, but a missing/unexecutable script still raises here
+                        subprocess.Popen(["./create_container.sh", payload["instance_id"]])
 
                     else:
                         response_bytes = json.dumps({"error": "No valid data found"}).encode("utf-8")
@@ -1,42 +1,159 @@
-import json
-import urllib.request
+import orjson
+import os
+import sys
+import pybase64
+import http.client
+import threading
+import urllib.parse
 import time
-import base64
+from concurrent.futures import ThreadPoolExecutor
 
 # Dracula: "I have more percs than there are stars in the leo cluster"
 
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "8"))
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+
+# One kept-alive connection per thread per server, so frames don't each pay a handshake
+_local = threading.local()
+# Shared for the life of the process so the worker threads, and their connections, outlive a single call
+_EXECUTOR = ThreadPoolExecutor(max_workers=max(MAX_CONCURRENCY, 1))
+
+
+def _get_connection(host: str, port: int) -> http.client.HTTPConnection:
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get((host, port))
+    if conn is None:
+        conn = connections[(host, port)] = http.client.HTTPConnection(host, port)
+    return conn
+
+
+def _post(url: str, body: bytes, headers: dict) -> str:
+    """POST over a reused connection, reconnects once if the server dropped it"""
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+
+    for attempt in range(2):
+        conn = _get_connection(parts.hostname, parts.port or 80)
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            return conn.getresponse().read().decode("utf-8")
+        except (http.client.HTTPException, ConnectionError):
+            conn.close()
+            if attempt:
+                raise
+
+
 def send_json(url: str = "http://visionmodel:8001/", data: dict | None = None) -> str:
-    body = json.dumps(data or {}).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req) as response:
-        return response.read().decode("utf-8")
-
-
-def send_image(url: str = "http://visionmodel:8001/", image_path: str = "") -> str:
-    """Send an image file to the server"""
+    body = orjson.dumps(data or {})
+    return _post(url, body, {"Content-Type": "application/json"})
+
+
+def send_image(url: str = "http://visionmodel:8001/", image_path: str = "", filename: str | None = None) -> str:
+    """Send an image file to the server as raw JPEG bytes"""
     try:
-        # Read and encode image as base64
         with open(image_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode('utf-8')
-        
-        # Send as JSON
-        data = {
-            "image_data": image_data,
-            "filename": image_path
-        }
-        return send_json(url, data)
+            image_data = f.read()
+
+        # No base64/JSON wrapping, filename rides along in a header (percent-encoded, headers are Latin-1 only)
+        return _post(url, image_data, {
+            "Content-Type": "image/jpeg",
+            "X-Filename": urllib.parse.quote(filename or os.path.basename(image_path)),
+        })
     except Exception as e:
-        return json.dumps({"error": str(e)})
+        return orjson.dumps({"error": str(e)}).decode("utf-8")
+
+
+def send_batch(url: str = "http://visionmodel:8001/", image_paths: list[str] | None = None,
+               filenames: list[str] | None = None) -> str:
+    """Send a group of images to the server in a single request, results come back as parallel lists"""
+    image_paths = image_paths or []
+    filenames = filenames or [os.path.basename(p) for p in image_paths]
+    garbage_counts = [None] * len(image_paths)
+    errors = [None] * len(image_paths)
+
+    # A file that can't be read gets its own error, the rest still go out
+    images = []
+    sent = []
+    for index, (image_path, filename) in enumerate(zip(image_paths, filenames)):
+        try:
+            with open(image_path, "rb") as f:
+                images.append({
+                    "image_data": pybase64.b64encode(f.read()).decode("utf-8"),
+                    "filename": filename,
+                })
+            sent.append(index)
+        except OSError as e:
+            errors[index] = str(e)
+
+    if images:
+        try:
+            response = _parse_response(send_json(url, {"images": images}))
+        except Exception as e:
+            return orjson.dumps({"error": str(e)}).decode("utf-8")
+        if "garbage_counts" not in response:
+            # The request as a whole failed, pass that back as is
+            return orjson.dumps(response).decode("utf-8")
+
+        response_errors = response.get("errors") or [None] * len(sent)
+        for index, count, error in zip(sent, response["garbage_counts"], response_errors):
+            garbage_counts[index] = count
+            errors[index] = error
+
+    return orjson.dumps({
+        "filenames": filenames,
+        "garbage_counts": garbage_counts,
+        "errors": errors,
+    }).decode("utf-8")
+
+
+def _parse_response(raw_response: str) -> dict:
+    try:
+        return orjson.loads(raw_response)
+    except ValueError:
+        return {"error": raw_response}
+
+
+def send_images(url: str = "http://visionmodel:8001/", image_paths: list[str] | None = None) -> dict:
+    """Send several images to the server at once, results come back as parallel lists in the same order"""
+    image_paths = image_paths or []
+    # Split names off once here so the worker threads don't redo it
+    entries = [(p, os.path.basename(p)) for p in image_paths]
+    batch_size = max(BATCH_SIZE, 1)
+    batches = [entries[i:i + batch_size] for i in range(0, len(entries), batch_size)]
+
+    def send_group(batch: list[tuple[str, str]]) -> tuple[list, list]:
+        paths = [path for path, _ in batch]
+        names = [name for _, name in batch]
+        # Lone images go over the cheaper raw upload
+        if len(batch) == 1:
+            response = _parse_response(send_image(url, paths[0], names[0]))
+            return [response.get("garbage_count")], [response.get("error")]
+        response = _parse_response(send_batch(url, paths, names))
+        if "garbage_counts" in response:
+            return response["garbage_counts"], response["errors"]
+        # The batch request itself failed, fall back to sending each image on its own
+        responses = [_parse_response(send_image(url, path, name)) for path, name in batch]
+        return [r.get("garbage_count") for r in responses], [r.get("error") for r in responses]
+
+    batch_results = list(_EXECUTOR.map(send_group, batches))
+
+    garbage_counts = []
+    errors = []
+    for counts, batch_errors in batch_results:
+        garbage_counts.extend(counts)
+        errors.extend(batch_errors)
+    return {"frames": image_paths, "garbage_counts": garbage_counts, "errors": errors}
+
 
 if __name__ == "__main__":
-    print("Sending image...")
-    result = send_image(image_path="abc.jpg")
-    print("Result:", result)
+    # Logs go to stderr so stdout carries nothing but the result JSON
+    print("Sending images...", file=sys.stderr)
+    result = send_images(image_paths=["ab.jpg", "abc.jpg"])
+    print(orjson.dumps(result).decode("utf-8"))
 
 
 
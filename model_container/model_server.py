@@ -1,24 +1,99 @@
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from main import predict
-import base64
-import tempfile
-import os
+from main import predict_array, predict_batch
+import cv2
+import numpy as np
+import pybase64
+import orjson
+import urllib.parse
+
+CHUNK_SIZE = 1 << 20
+# read_image allocates the whole body up front, so refuse anything bigger before that happens
+MAX_IMAGE_BYTES = 20 << 20
+
+
+def read_image(stream, length: int) -> bytearray:
+    """Read length bytes from stream into one preallocated buffer, a chunk at a time"""
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    received = 0
+    while received < length:
+        n = stream.readinto(view[received:received + CHUNK_SIZE])
+        if not n:
+            raise ValueError(f"Upload ended after {received} of {length} bytes")
+        received += n
+    return buffer
+
+
+def decode_image(image_data) -> np.ndarray:
+    # Decoded straight from memory, no temp file round trip
+    image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return image
+
+
+def process_image(image_data, filename: str) -> dict:
+    """Run the model on raw image bytes and build the response payload"""
+    # Run prediction on the uploaded image
+    amt = predict_array(decode_image(image_data))
+
+    return {
+        "garbage_count": amt,
+        "filename": filename,
+        "message": "Image processed successfully"
+    }
 
 
 class SimpleHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests, every response sets Content-Length
+    protocol_version = "HTTP/1.1"
+
     def do_POST(self):
         content_length_header = self.headers.get("Content-Length")
         length = int(content_length_header or 0)
-        raw_body = self.rfile.read(length) if length > 0 else b""
-
 
         content_type = self.headers.get("Content-Type", "").lower()
+        if content_type.startswith("image/") or content_type.startswith("application/octet-stream"):
+            # Raw image upload, no base64 to undo
+            filename = urllib.parse.unquote(self.headers.get("X-Filename", "unknown"))
+            print(f"Received image: {filename}")
+            status = 200
+            if length > MAX_IMAGE_BYTES:
+                # Body is left unread, close so it isn't parsed as the next request
+                self.close_connection = True
+                status = 413
+                response_bytes = orjson.dumps({"error": f"Image is larger than {MAX_IMAGE_BYTES} bytes"})
+            else:
+                try:
+                    image_data = read_image(self.rfile, length)
+                except Exception as e:
+                    # Unread body may still be on the socket, don't reuse it
+                    self.close_connection = True
+                    print(f"Upload failed: {e}")
+                    response_bytes = orjson.dumps({"error": str(e)})
+                else:
+                    # Body was read in full, so a bad image or failed prediction keeps the connection
+                    try:
+                        response_bytes = orjson.dumps(process_image(image_data, filename))
+                    except Exception as e:
+                        print(f"Prediction failed: {e}")
+                        response_bytes = orjson.dumps({"error": str(e)})
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(response_bytes)))
+            if self.close_connection:
+                # Tell the client too, so it doesn't reuse a socket we're about to close
+                self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(response_bytes)
+            return
+
+        raw_body = self.rfile.read(length) if length > 0 else b""
+
         if "application/json" in content_type:
             try:
-                import json
-
-                payload = json.loads(raw_body.decode("utf-8") or "null")
-                response_bytes = json.dumps({"received": payload}).encode("utf-8")
+                payload = orjson.loads(raw_body or b"null")
 
                 self.send_response(200)
                 self.send_header("Content-Type", "application/json; charset=utf-8")
@@ -30,30 +105,44 @@ class SimpleHandler(BaseHTTPRequestHandler):
                         print(f"Received image: {payload.get('filename', 'unknown')}")
                         
                         # Decode base64 image data
-                        image_data = base64.b64decode(payload["image_data"])
-                        
-                        # Save to temporary file
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-                            temp_file.write(image_data)
-                            temp_path = temp_file.name
-                        
-                        # Run prediction on the uploaded image
-                        amt = predict(temp_path)
-                        
-                        # Clean up temporary file
-                        os.unlink(temp_path)
-                        
-                        response_bytes = json.dumps({
-                            "garbage_count": amt,
-                            "filename": payload.get("filename", "unknown"),
-                            "message": "Image processed successfully"
-                        }).encode("utf-8")
+                        image_data = pybase64.b64decode(payload["image_data"], validate=False)
+
+                        response_bytes = orjson.dumps(process_image(image_data, payload.get("filename", "unknown")))
+                    # Several images in one request, answered in the same order
+                    elif "images" in payload:
+                        print(f"Received batch of {len(payload['images'])} images")
+
+                        # Parallel lists instead of a dict per image, keys aren't repeated per frame
+                        filenames = [image.get("filename", "unknown") for image in payload["images"]]
+                        garbage_counts = [None] * len(filenames)
+                        errors = [None] * len(filenames)
+
+                        # A bad image only fails itself, the rest of the batch still runs
+                        images = []
+                        decoded = []
+                        for index, image in enumerate(payload["images"]):
+                            try:
+                                images.append(decode_image(pybase64.b64decode(image["image_data"], validate=False)))
+                                decoded.append(index)
+                            except Exception as e:
+                                errors[index] = str(e)
+
+                        # One batched model call instead of one per image
+                        for index, count in zip(decoded, predict_batch(images)):
+                            garbage_counts[index] = count
+
+                        response_bytes = orjson.dumps({
+                            "filenames": filenames,
+                            "garbage_counts": garbage_counts,
+                            "errors": errors,
+                            "message": "Images processed successfully"
+                        })
                     else:
-                        response_bytes = json.dumps({"error": "No valid data found"}).encode("utf-8")
+                        response_bytes = orjson.dumps({"error": "No valid data found"})
                         
                 except Exception as e:
                     print(f"Prediction failed: {e}")
-                    response_bytes = json.dumps({"error": str(e)}).encode("utf-8")
+                    response_bytes = orjson.dumps({"error": str(e)})
 
                 self.send_header("Content-Length", str(len(response_bytes)))
                 self.end_headers()
@@ -81,6 +170,9 @@ class SimpleHandler(BaseHTTPRequestHandler):
 
 
 def run(host: str = "127.0.0.1", port: int = 8001) -> None:
+    # Load the weights and push one blank image through now so the first request doesn't pay for it
+    predict_array(np.zeros((640, 640, 3), dtype=np.uint8))
+
     server = ThreadingHTTPServer((host, port), SimpleHandler)
     print(f"Serving on http://{host}:{port}")
     try: